@@ -17,15 +17,36 @@ Examples:
 
   HA_BASE_URL=http://homeassistant.local:8123 HA_TOKEN=... \
     python3 scripts/ha_test_harness.py split --energy-wh 900
+
+  python3 scripts/ha_test_harness.py serve &
+  HA_BASE_URL=http://homeassistant.local:8123 HA_TOKEN=... \
+    python3 scripts/ha_test_harness.py dump --via-daemon
 """
 from __future__ import annotations
 
 import argparse
+import contextlib
+import gzip
+import http.client
+import io
 import json
 import os
+import random
+import socket
+import socketserver
+import stat
 import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from urllib import error, request
+from urllib import parse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 DEFAULTS = {
@@ -38,8 +59,38 @@ DEFAULTS = {
     "last_processed_helper": "input_text.test_last_processed_date",
     "active_state": "running",
     "inactive_state": "off",
+    "socket": "/tmp/ha_harness.sock",
 }
 
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    # json.loads accepts UTF-8 bytes directly.
+    _loads = json.loads
+
+
+def _pretty(obj, sort_keys: bool = False) -> str:
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, indent=2, sort_keys=sort_keys, ensure_ascii=False)
+
+
+# Keep-alive connections reused across calls, keyed by (scheme, netloc).
+# Connections are not thread-safe, so each worker thread keeps its own.
+_LOCAL = threading.local()
+_EXECUTOR: ThreadPoolExecutor | None = None
+
+# Transient HA/proxy responses worth retrying; other errors fail immediately.
+_RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
 
 def _require(value: str | None, label: str) -> str:
     if value:
@@ -48,31 +99,115 @@ def _require(value: str | None, label: str) -> str:
     sys.exit(2)
 
 
-def _base_url(args) -> str:
-    return _require(args.base_url, "HA_BASE_URL or --base-url")
-
-
-def _token(args) -> str:
-    return _require(args.token, "HA_TOKEN or --token")
+def _connection(scheme: str, netloc: str) -> http.client.HTTPConnection:
+    connections = getattr(_LOCAL, "connections", None)
+    if connections is None:
+        connections = _LOCAL.connections = {}
+    key = (scheme, netloc)
+    conn = connections.get(key)
+    if conn is None:
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=30)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=30)
+        connections[key] = conn
+    return conn
+
+
+def _prepare(args):
+    base_url = _require(args.base_url, "HA_BASE_URL or --base-url")
+    token = _require(args.token, "HA_TOKEN or --token")
+    args._base = parse.urlsplit(base_url.rstrip("/"))
+    if args._base.scheme not in {"http", "https"} or not args._base.netloc:
+        print(
+            f"Invalid base URL (expected http:// or https://host): {base_url}",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+    args._headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": "gzip",
+    }
 
 
-def _request(args, method: str, path: str, payload: dict | None = None):
-    url = _base_url(args).rstrip("/") + path
-    data = None if payload is None else json.dumps(payload).encode("utf-8")
-    req = request.Request(url, data=data, method=method)
-    req.add_header("Authorization", f"Bearer {_token(args)}")
-    req.add_header("Content-Type", "application/json")
+def _send(args, method: str, path: str, data: bytes | None):
+    base = args._base
+    conn = _connection(base.scheme, base.netloc)
+    try:
+        try:
+            conn.request(method, base.path + path, body=data, headers=args._headers)
+            resp = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server dropped the idle keep-alive socket; reconnect once.
+            conn.close()
+            conn.request(method, base.path + path, body=data, headers=args._headers)
+            resp = conn.getresponse()
+        # Always drain the body so the connection can be reused. Callers parse
+        # the raw bytes: json.load() on the socket would buffer it all anyway.
+        body = resp.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        raise
+    if resp.getheader("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return resp, body
+
+
+def _retry_after(resp) -> float:
     try:
-        with request.urlopen(req, timeout=30) as resp:
-            body = resp.read()
-            if not body:
-                return None
-            return json.loads(body.decode("utf-8"))
-    except error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="replace")
-        raise RuntimeError(f"{method} {path} failed: {exc.code} {detail}") from exc
-    except error.URLError as exc:
-        raise RuntimeError(f"{method} {path} failed: {exc.reason}") from exc
+        return float(resp.getheader("Retry-After", 0))
+    except ValueError:
+        return 0.0
+
+
+def _request(
+    args,
+    method: str,
+    path: str,
+    payload: dict | None = None,
+    *,
+    max_retries: int = 3,
+    base: float = 1.0,
+    cap: float = 30.0,
+):
+    data = None if payload is None else _dumps(payload)
+    for attempt in range(max_retries + 1):
+        retry_after = 0.0
+        try:
+            resp, body = _send(args, method, path, data)
+        except (ConnectionError, TimeoutError) as exc:
+            if attempt == max_retries:
+                raise RuntimeError(f"{method} {path} failed: {exc}") from exc
+        except (OSError, http.client.HTTPException) as exc:
+            # Bad URLs, DNS and TLS failures will not fix themselves.
+            raise RuntimeError(f"{method} {path} failed: {exc}") from exc
+        else:
+            if 200 <= resp.status < 300:
+                if not body:
+                    return None
+                return _loads(body)
+            if 300 <= resp.status < 400:
+                # Redirects are not followed; usually --base-url needs https.
+                location = resp.getheader("Location", "")
+                raise RuntimeError(
+                    f"{method} {path} failed: {resp.status} redirect to {location}"
+                    " (check --base-url)"
+                )
+            if resp.status not in _RETRY_STATUSES or attempt == max_retries:
+                detail = body.decode("utf-8", errors="replace")
+                raise RuntimeError(f"{method} {path} failed: {resp.status} {detail}")
+            retry_after = _retry_after(resp)
+        delay = min(cap, base * (2**attempt)) * (1 + random.random() * 0.5)
+        time.sleep(max(delay, retry_after))
+
+
+def _gather(*calls):
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=8)
+    futures = [_EXECUTOR.submit(call) for call in calls]
+    return [future.result() for future in futures]
 
 
 def _domain(entity_id: str) -> str:
@@ -90,13 +225,13 @@ def _set_state(args, entity_id: str, state, attributes: dict | None = None):
     return _request(args, "POST", f"/api/states/{entity_id}", payload)
 
 
-def _set_input_number(args, entity_id: str, value: float):
+def _set_input_number(args, entity_id: str | list[str], value: float):
     return _call_service(
         args, "input_number", "set_value", {"entity_id": entity_id, "value": value}
     )
 
 
-def _set_input_text(args, entity_id: str, value: str):
+def _set_input_text(args, entity_id: str | list[str], value: str):
     return _call_service(
         args, "input_text", "set_value", {"entity_id": entity_id, "value": value}
     )
@@ -113,17 +248,25 @@ def _set_input_boolean(args, entity_id: str, value: str):
     return _call_service(args, "input_boolean", service, {"entity_id": entity_id})
 
 
+_SETTERS = {
+    "input_number": lambda args, entity_id, value: _set_input_number(
+        args, entity_id, float(value)
+    ),
+    "input_text": lambda args, entity_id, value: _set_input_text(
+        args, entity_id, str(value)
+    ),
+    "input_select": lambda args, entity_id, value: _set_input_select(
+        args, entity_id, str(value)
+    ),
+    "input_boolean": lambda args, entity_id, value: _set_input_boolean(
+        args, entity_id, str(value)
+    ),
+}
+
+
 def _set_by_domain(args, entity_id: str, value):
-    domain = _domain(entity_id)
-    if domain == "input_number":
-        return _set_input_number(args, entity_id, float(value))
-    if domain == "input_text":
-        return _set_input_text(args, entity_id, str(value))
-    if domain == "input_select":
-        return _set_input_select(args, entity_id, str(value))
-    if domain == "input_boolean":
-        return _set_input_boolean(args, entity_id, str(value))
-    return _set_state(args, entity_id, value)
+    setter = _SETTERS.get(_domain(entity_id), _set_state)
+    return setter(args, entity_id, value)
 
 
 def _get_state(args, entity_id: str):
@@ -137,6 +280,16 @@ def _parse_start_iso(value: str) -> datetime:
         raise RuntimeError(f"Invalid --start-iso value: {value}") from exc
 
 
+def _non_negative_float(value: str) -> float:
+    try:
+        number = float(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid number: {value}") from exc
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value}")
+    return number
+
+
 def _local_midnight(now: datetime) -> datetime:
     return now.replace(hour=0, minute=0, second=0, microsecond=0)
 
@@ -145,16 +298,25 @@ def _timestamp(dt: datetime) -> int:
     return int(dt.timestamp())
 
 
-def _init_helpers(args, energy_wh: float | None):
-    _set_input_number(args, args.lifetime_helper, 0)
-    _set_input_number(args, args.daily_active_helper, 0)
-    _set_input_text(args, args.durations_helper, "[]")
-    _set_input_text(args, args.last_processed_helper, "")
-    _call_service(
+def _set_cycle_start(args, timestamp: int):
+    return _call_service(
         args,
         "input_datetime",
         "set_datetime",
-        {"entity_id": args.cycle_start_helper, "timestamp": 0},
+        {"entity_id": args.cycle_start_helper, "timestamp": timestamp},
+    )
+
+
+def _init_helpers(args, energy_wh: float | None):
+    # Helper resets are independent of each other; the status and energy
+    # writes trigger the automation, so they go out afterwards, in order.
+    _gather(
+        lambda: _set_input_number(
+            args, [args.lifetime_helper, args.daily_active_helper], 0
+        ),
+        lambda: _set_input_text(args, args.durations_helper, "[]"),
+        lambda: _set_input_text(args, args.last_processed_helper, ""),
+        lambda: _set_cycle_start(args, 0),
     )
     _set_by_domain(args, args.status_entity, args.inactive_state)
     if energy_wh is not None:
@@ -172,14 +334,10 @@ def cmd_start(args):
 
 
 def cmd_end(args):
+    now = datetime.now()
     if args.duration_sec is not None:
-        start = datetime.now() - timedelta(seconds=args.duration_sec)
-        _call_service(
-            args,
-            "input_datetime",
-            "set_datetime",
-            {"entity_id": args.cycle_start_helper, "timestamp": _timestamp(start)},
-        )
+        start = now - timedelta(seconds=args.duration_sec)
+        _set_cycle_start(args, _timestamp(start))
     _set_by_domain(args, args.status_entity, args.inactive_state)
     print(f"Set status to {args.inactive_state}.")
 
@@ -195,12 +353,7 @@ def cmd_split(args):
         start = _parse_start_iso(args.start_iso)
     else:
         start = _local_midnight(now) - timedelta(minutes=10)
-    _call_service(
-        args,
-        "input_datetime",
-        "set_datetime",
-        {"entity_id": args.cycle_start_helper, "timestamp": _timestamp(start)},
-    )
+    _set_cycle_start(args, _timestamp(start))
     _set_by_domain(args, args.status_entity, args.active_state)
     _set_by_domain(args, args.energy_write_entity, args.energy_wh)
     print("Set a pre-midnight start, set status active, and updated energy.")
@@ -209,17 +362,18 @@ def cmd_split(args):
 def cmd_scenario(args):
     if args.init:
         _init_helpers(args, 0)
+    # Snapshot "now" after the init writes so the simulated duration is exact.
+    now = datetime.now()
     if args.start_iso:
         start = _parse_start_iso(args.start_iso)
     else:
-        start = datetime.now() - timedelta(seconds=args.duration_sec)
-    _call_service(
-        args,
-        "input_datetime",
-        "set_datetime",
-        {"entity_id": args.cycle_start_helper, "timestamp": _timestamp(start)},
-    )
+        start = now - timedelta(seconds=args.duration_sec)
+    _set_cycle_start(args, _timestamp(start))
+    # Both status writes are needed: the blueprint only records a cycle on a
+    # state change to inactive, and the status is usually inactive already.
     _set_by_domain(args, args.status_entity, args.active_state)
+    if args.dwell_sec:
+        time.sleep(args.dwell_sec)
     _set_by_domain(args, args.status_entity, args.inactive_state)
     _set_by_domain(args, args.energy_write_entity, args.energy_wh)
     print("Ran scenario: start -> end -> energy update.")
@@ -235,9 +389,142 @@ def cmd_dump(args):
         args.durations_helper,
         args.last_processed_helper,
     ]
-    for entity_id in entities:
-        state = _get_state(args, entity_id)
-        print(json.dumps(state, indent=2, sort_keys=True))
+    if args.parallel:
+        # Fetch only the test entities, overlapping the requests; cheaper than
+        # /api/states on installs with many entities.
+        states = _gather(*(lambda e=e: _get_state(args, e) for e in entities))
+    else:
+        # One /api/states call instead of a round-trip per entity.
+        all_states = _request(args, "GET", "/api/states")
+        by_id = {state["entity_id"]: state for state in all_states}
+        states = []
+        for entity_id in entities:
+            if entity_id not in by_id:
+                raise RuntimeError(f"{entity_id} not found in GET /api/states")
+            states.append(by_id[entity_id])
+    for state in states:
+        print(_pretty(state, sort_keys=args.sorted))
+
+
+_COMMANDS = {
+    "init": cmd_init,
+    "start": cmd_start,
+    "end": cmd_end,
+    "energy": cmd_energy,
+    "split": cmd_split,
+    "scenario": cmd_scenario,
+    "dump": cmd_dump,
+}
+
+
+def _run(args) -> int:
+    try:
+        _COMMANDS[args.command](args)
+    except RuntimeError as exc:
+        print(str(exc), file=sys.stderr)
+        return 1
+    return 0
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # A bare connect, e.g. another serve checking we are alive.
+            return
+        message = _loads(line)
+        args = argparse.Namespace(**message["args"])
+        args.command = message["cmd"]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                _prepare(args)
+                code = _run(args)
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                code = 1
+        reply = {
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            "exit": code,
+        }
+        self.wfile.write(_dumps(reply) + b"\n")
+
+
+def _own_socket(path: str) -> bool:
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+def _remove_stale_socket(path: str):
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        print(f"Refusing to replace non-socket path: {path}", file=sys.stderr)
+        sys.exit(2)
+    # Only a socket nobody is listening on is a leftover that is safe to remove.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+        except OSError as exc:
+            print(f"Cannot use socket {path}: {exc}", file=sys.stderr)
+            sys.exit(2)
+    print(f"A daemon is already listening on {path}.", file=sys.stderr)
+    sys.exit(2)
+
+
+def cmd_serve(args):
+    # Commands run one at a time on this thread, so the keep-alive
+    # connections cached for it are reused by every forwarded command.
+    _remove_stale_socket(args.socket)
+    # Forwarded commands carry the caller's token; create the socket private
+    # rather than tightening it after bind.
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(args.socket, _DaemonHandler)
+    finally:
+        os.umask(old_umask)
+    with server:
+        print(f"Listening on {args.socket}.", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+def _forward(args) -> int | None:
+    # None means no daemon to use, so the caller runs the command locally.
+    # Anyone can create a socket in /tmp; only send our token to one we own.
+    if not hasattr(socket, "AF_UNIX") or not _own_socket(args.socket):
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(args.socket)
+        except OSError:
+            return None
+        message = {"cmd": args.command, "args": vars(args)}
+        sock.sendall(_dumps(message) + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        print(f"Daemon at {args.socket} closed the connection.", file=sys.stderr)
+        return 1
+    reply = _loads(line)
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["exit"]
 
 
 def _add_common_args(parser: argparse.ArgumentParser):
@@ -301,6 +588,16 @@ def _add_common_args(parser: argparse.ArgumentParser):
         default=os.environ.get("HA_INACTIVE_STATE", DEFAULTS["inactive_state"]),
         help="State treated as inactive",
     )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("HA_HARNESS_SOCKET", DEFAULTS["socket"]),
+        help="UNIX socket used by serve and --via-daemon",
+    )
+    parser.add_argument(
+        "--via-daemon",
+        action="store_true",
+        help="Forward the command to a running serve daemon, if any",
+    )
 
 
 def main():
@@ -308,44 +605,40 @@ def main():
         description="Energy Backfill test harness (Home Assistant REST API)."
     )
     subparsers = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    _add_common_args(common)
 
-    parser_init = subparsers.add_parser("init", help="Reset helpers to a clean state")
-    _add_common_args(parser_init)
+    parser_init = subparsers.add_parser(
+        "init", parents=[common], help="Reset helpers to a clean state"
+    )
     parser_init.add_argument("--energy-wh", type=float, default=0)
-    parser_init.set_defaults(func=cmd_init)
 
-    parser_start = subparsers.add_parser("start", help="Start a cycle")
-    _add_common_args(parser_start)
-    parser_start.set_defaults(func=cmd_start)
+    subparsers.add_parser("start", parents=[common], help="Start a cycle")
 
-    parser_end = subparsers.add_parser("end", help="End a cycle")
-    _add_common_args(parser_end)
+    parser_end = subparsers.add_parser("end", parents=[common], help="End a cycle")
     parser_end.add_argument("--duration-sec", type=int)
-    parser_end.set_defaults(func=cmd_end)
 
     parser_energy = subparsers.add_parser(
-        "energy", help="Update the energy-yesterday sensor"
+        "energy", parents=[common], help="Update the energy-yesterday sensor"
     )
-    _add_common_args(parser_energy)
     parser_energy.add_argument("--energy-wh", type=float, required=True)
-    parser_energy.set_defaults(func=cmd_energy)
 
     parser_split = subparsers.add_parser(
         "split",
+        parents=[common],
         help="Simulate a cycle that crosses midnight and trigger energy update",
     )
-    _add_common_args(parser_split)
     parser_split.add_argument("--energy-wh", type=float, required=True)
     parser_split.add_argument(
         "--start-iso",
         help="ISO start time (defaults to yesterday 23:50 local time)",
     )
-    parser_split.set_defaults(func=cmd_split)
 
     parser_scenario = subparsers.add_parser(
-        "scenario", help="Run a basic cycle + energy update scenario"
+        "scenario",
+        parents=[common],
+        help="Run a basic cycle + energy update scenario",
     )
-    _add_common_args(parser_scenario)
     parser_scenario.add_argument("--energy-wh", type=float, required=True)
     parser_scenario.add_argument(
         "--duration-sec",
@@ -357,26 +650,54 @@ def main():
         "--start-iso",
         help="ISO start time (overrides --duration-sec)",
     )
+    parser_scenario.add_argument(
+        "--dwell-sec",
+        type=_non_negative_float,
+        default=0.0,
+        help="Seconds to stay active before ending the cycle (default: 0)",
+    )
     parser_scenario.add_argument(
         "--init",
         action="store_true",
         help="Reset helpers before running the scenario",
     )
-    parser_scenario.set_defaults(func=cmd_scenario)
 
-    parser_dump = subparsers.add_parser("dump", help="Dump test entity states")
-    _add_common_args(parser_dump)
-    parser_dump.set_defaults(func=cmd_dump)
+    parser_dump = subparsers.add_parser(
+        "dump", parents=[common], help="Dump test entity states"
+    )
+    parser_dump.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Fetch each entity concurrently instead of all states at once",
+    )
+    parser_dump.add_argument(
+        "--sorted",
+        action="store_true",
+        help="Sort keys in the output (stable for diffing)",
+    )
+
+    parser_serve = subparsers.add_parser(
+        "serve", help="Keep connections open and run commands sent with --via-daemon"
+    )
+    parser_serve.add_argument(
+        "--socket",
+        default=os.environ.get("HA_HARNESS_SOCKET", DEFAULTS["socket"]),
+        help="UNIX socket to listen on",
+    )
 
     args = parser.parse_args()
+    if args.command == "serve":
+        cmd_serve(args)
+        return
     if not args.energy_write_entity:
         args.energy_write_entity = args.energy_sensor
 
-    try:
-        args.func(args)
-    except RuntimeError as exc:
-        print(str(exc), file=sys.stderr)
-        sys.exit(1)
+    code = _forward(args) if args.via_daemon else None
+    if code is None:
+        _prepare(args)
+        code = _run(args)
+    if code:
+        sys.exit(code)
 
 
 if __name__ == "__main__":